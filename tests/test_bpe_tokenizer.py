@@ -1,4 +1,5 @@
 import os
+import random
 
 from unit_tokenizer import BPETokenizer
 
@@ -12,6 +13,50 @@ def test_fit():
     assert tokenizer.merge_rules == [((0, 1), 6), ((6, 2), 7), ((7, 3), 8), ((8, 4), 9)]
 
 
+def test_fit_matches_full_recount():
+    rng = random.Random(0)
+    train_data = [[rng.randrange(4) for _ in range(rng.randrange(1, 30))] for _ in range(20)]
+    tokenizer = BPETokenizer()
+    tokenizer.fit(train_data=train_data, target_vocab_size=30)
+
+    # Reference: recount every pair and rewrite every sequence at each merge.
+    reference = BPETokenizer()
+    units_list = train_data
+    max_idx = 3
+    for _ in range(len(tokenizer.merge_rules)):
+        counts = reference._get_counts(units_list)
+        top_pair, _count = max(counts.items(), key=lambda x: (x[1], -x[0][0], -x[0][1]))
+        max_idx += 1
+        units_list = reference._merge(units_list, top_pair, max_idx)
+        reference.merge_rules.append((top_pair, max_idx))
+
+    assert len(tokenizer.merge_rules) > 0
+    assert tokenizer.merge_rules == reference.merge_rules
+
+
+def test_fit_parallel():
+    train_data = [[0, 1, 0, 1, 2, 0, 1, 2, 3], [0, 1, 2, 3, 4, 0, 1, 2, 3, 4, 5], [2, 2, 2, 1, 0], [5, 4, 5, 4]]
+    tokenizer = BPETokenizer()
+    tokenizer.fit(train_data=train_data, target_vocab_size=12, n_jobs=2)
+    reference = BPETokenizer()
+    reference.fit(train_data=train_data, target_vocab_size=12)
+    assert tokenizer.merge_rules == reference.merge_rules
+
+
+def test_fit_weighted():
+    train_data = [[0, 1, 2, 3, 4, 0, 1, 2, 3, 4, 5], [0, 1, 0, 1, 2, 0, 1, 2, 3], [0, 1, 2, 3, 4, 0, 1, 2, 3, 4, 5]]
+    reference = BPETokenizer()
+    reference.fit(train_data=train_data, target_vocab_size=10)
+
+    tokenizer = BPETokenizer()
+    tokenizer.fit(train_data=train_data[:2], target_vocab_size=10, weights=[2, 1])
+    assert tokenizer.merge_rules == reference.merge_rules
+
+    tokenizer = BPETokenizer()
+    tokenizer.fit(train_data=train_data, target_vocab_size=10, deduplicate=True)
+    assert tokenizer.merge_rules == reference.merge_rules
+
+
 def test_encode():
     tokenizer = BPETokenizer()
     tokenizer.fit(
@@ -22,6 +67,22 @@ def test_encode():
     assert encoded[0] == [6, 9, 5]
 
 
+def test_encode_matches_sequential_merges():
+    rng = random.Random(0)
+    tokenizer = BPETokenizer()
+    tokenizer.fit(
+        train_data=[[rng.randrange(3) for _ in range(50)] for _ in range(5)] + [[0, 0, 0, 0, 0]],
+        target_vocab_size=20,
+    )
+    units_list = [[rng.randrange(3) for _ in range(rng.randrange(30))] for _ in range(20)] + [[0] * 7]
+    expected = []
+    for units in units_list:
+        for pair, new_token in tokenizer.merge_rules:
+            units = tokenizer._merge([units], pair, new_token)[0]
+        expected.append(units)
+    assert tokenizer.encode(units_list) == expected
+
+
 def test_decode():
     tokenizer = BPETokenizer()
     tokenizer.fit(
@@ -100,6 +161,23 @@ def test_fit_from_file():
     os.remove(train_data_file)
 
 
+def test_fit_from_file_streaming():
+    train_data_file = "test_fit_from_file_streaming.txt"
+
+    with open(train_data_file, "w") as f:
+        f.write("0 1 0 1 2 0 1 2 3\n0 1 2 3 4 0 1 2 3 4 5\n2 2 2 1\n0 1 2 3 4 0 1 2 3 4 5\n2 2 2 1\n\n")
+
+    tokenizer = BPETokenizer()
+    tokenizer.fit_from_file(train_data_file, target_vocab_size=12, streaming=True, max_sequences_in_memory=1)
+    reference = BPETokenizer()
+    reference.fit_from_file(train_data_file, target_vocab_size=12)
+
+    assert tokenizer.merge_rules == reference.merge_rules
+
+    # clean up
+    os.remove(train_data_file)
+
+
 def test_encode_from_file():
     input_file = "test_encode_from_file_input.txt"
     output_file = "test_encode_from_file_output.txt"
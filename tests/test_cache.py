@@ -0,0 +1,23 @@
+from unit_tokenizer.cache import LRUCache
+
+
+def test_get_or_compute():
+    cache = LRUCache(max_entries=2)
+    assert cache.get_or_compute((0, 1), lambda key: [sum(key)]) == [1]
+    assert cache.get_or_compute((0, 1), lambda key: [-1]) == [1]
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_eviction():
+    cache = LRUCache(max_entries=2)
+    for key in [(0,), (1,), (0,), (2,)]:
+        cache.get_or_compute(key, list)
+    # (1,) was the least recently used entry.
+    assert cache.get_or_compute((1,), lambda key: [-1]) == [-1]
+    assert len(cache) == 2
+
+    cache = LRUCache(max_entries=10, max_bytes=48)
+    for key in [(0, 1), (2, 3), (4, 5)]:
+        cache.get_or_compute(key, list)
+    assert len(cache) == 1
+    assert cache.nbytes == 32
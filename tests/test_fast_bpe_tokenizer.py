@@ -1,6 +1,6 @@
 import os
 
-from unit_tokenizer import FastBPETokenizer
+from unit_tokenizer import BPETokenizer, FastBPETokenizer
 
 
 def test_fit():
@@ -12,6 +12,38 @@ def test_fit():
     assert tokenizer.merge_rules == [((0, 1), 6), ((6, 2), 7), ((7, 3), 8), ((8, 4), 9)]
 
 
+def test_fit_matches_bpe_tokenizer():
+    train_data = [[0, 0, 0, 1, 1, 1, 1, 0, 0, 0], [2, 0, 0, 1, 2, 2, 2], [1, 0, 1, 0, 1]]
+    tokenizer = FastBPETokenizer()
+    tokenizer.fit(units_list=train_data, target_vocab_size=12)
+    reference = BPETokenizer()
+    reference.fit(train_data=train_data, target_vocab_size=12)
+    assert tokenizer.merge_rules == reference.merge_rules
+
+
+def test_fit_parallel():
+    units_list = [[0, 1, 0, 1, 2, 0, 1, 2, 3], [0, 1, 2, 3, 4, 0, 1, 2, 3, 4, 5], [2, 2, 2, 1, 0], [5, 4, 5, 4]]
+    tokenizer = FastBPETokenizer()
+    tokenizer.fit(units_list=units_list, target_vocab_size=12, n_jobs=2)
+    reference = FastBPETokenizer()
+    reference.fit(units_list=units_list, target_vocab_size=12)
+    assert tokenizer.merge_rules == reference.merge_rules
+
+
+def test_fit_weighted():
+    units_list = [[0, 1, 2, 3, 4, 0, 1, 2, 3, 4, 5], [0, 1, 0, 1, 2, 0, 1, 2, 3], [0, 1, 2, 3, 4, 0, 1, 2, 3, 4, 5]]
+    reference = FastBPETokenizer()
+    reference.fit(units_list=units_list, target_vocab_size=10)
+
+    tokenizer = FastBPETokenizer()
+    tokenizer.fit(units_list=units_list[:2], target_vocab_size=10, weights=[2, 1])
+    assert tokenizer.merge_rules == reference.merge_rules
+
+    tokenizer = FastBPETokenizer()
+    tokenizer.fit(units_list=units_list, target_vocab_size=10, deduplicate=True)
+    assert tokenizer.merge_rules == reference.merge_rules
+
+
 def test_encode():
     tokenizer = FastBPETokenizer()
     tokenizer.fit(
@@ -22,6 +54,36 @@ def test_encode():
     assert encoded[0] == [6, 9, 5]
 
 
+def test_encode_modes():
+    units_list = [[0, 0, 0, 0, 0], [2, 0]]
+    reference = BPETokenizer()
+    reference.fit(train_data=units_list, target_vocab_size=5)
+    assert reference.encode(units_list) == [[3, 5], [4]]
+
+    tokenizer = FastBPETokenizer()
+    tokenizer.fit(units_list=units_list, target_vocab_size=5)
+    assert tokenizer.encode(units_list) == [[3, 5], [4]]
+
+    # The greedy longest match differs from the merge order.
+    tokenizer = FastBPETokenizer(encode_mode="trie")
+    tokenizer.fit(units_list=units_list, target_vocab_size=5)
+    assert tokenizer.encode(units_list) == [[5, 3], [4]]
+
+
+def test_encode_cache():
+    tokenizer = FastBPETokenizer(cache_size=10)
+    tokenizer.fit(
+        units_list=[[0, 1, 0, 1, 2, 0, 1, 2, 3, 0, 1, 2, 3, 4, 0, 1, 2, 3, 4, 5]],
+        target_vocab_size=10,
+    )
+    encoded = tokenizer.encode([[0, 1, 0, 1, 2, 3, 4, 5], [0, 1, 0, 1, 2, 3, 4, 5]])
+    assert encoded == [[6, 9, 5], [6, 9, 5]]
+    assert (tokenizer.cache.hits, tokenizer.cache.misses) == (1, 1)
+
+    tokenizer.fit(units_list=[[0, 1, 0, 1, 2, 3, 4, 5]], target_vocab_size=7)
+    assert len(tokenizer.cache) == 0
+
+
 def test_decode():
     tokenizer = FastBPETokenizer()
     tokenizer.fit(
@@ -100,6 +162,23 @@ def test_fit_from_file():
     os.remove(train_data_file)
 
 
+def test_fit_from_file_streaming():
+    train_data_file = "test_fit_from_file_streaming.txt"
+
+    with open(train_data_file, "w") as f:
+        f.write("0 1 0 1 2 0 1 2 3\n0 1 2 3 4 0 1 2 3 4 5\n2 2 2 1\n0 1 2 3 4 0 1 2 3 4 5\n2 2 2 1\n\n")
+
+    tokenizer = FastBPETokenizer()
+    tokenizer.fit_from_file(train_data_file, target_vocab_size=12, streaming=True, max_sequences_in_memory=1)
+    reference = FastBPETokenizer()
+    reference.fit_from_file(train_data_file, target_vocab_size=12)
+
+    assert tokenizer.merge_rules == reference.merge_rules
+
+    # clean up
+    os.remove(train_data_file)
+
+
 def test_encode_from_file():
     input_file = "test_encode_from_file_input.txt"
     output_file = "test_encode_from_file_output.txt"
@@ -0,0 +1,23 @@
+from unit_tokenizer.priority_queue import IndexedPriorityQueue
+
+
+def test_pop_order():
+    queue = IndexedPriorityQueue({(2, 3): 5, (1, 4): 5, (1, 2): 5, (0, 0): 1})
+    assert [queue.pop() for _ in range(len(queue))] == [
+        ((1, 2), 5),
+        ((1, 4), 5),
+        ((2, 3), 5),
+        ((0, 0), 1),
+    ]
+
+
+def test_update_and_remove():
+    queue = IndexedPriorityQueue({(0, 1): 3, (1, 2): 2, (2, 3): 1})
+    queue.set((2, 3), 4)
+    assert queue.peek() == ((2, 3), 4)
+    queue.set((2, 3), 0)
+    assert (2, 3) not in queue
+    queue.set((0, 1), 1)
+    assert queue.pop() == ((1, 2), 2)
+    assert queue.pop() == ((0, 1), 1)
+    assert len(queue) == 0
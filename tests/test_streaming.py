@@ -0,0 +1,23 @@
+import os
+
+from unit_tokenizer.streaming import count_sequences, deduplicate_sequences
+
+
+def test_count_sequences():
+    train_data_file = "test_count_sequences.txt"
+
+    with open(train_data_file, "w") as f:
+        f.write("3 1\n0 1 2\n3 1\n\n0 1 2\n3 1\n2\n")
+
+    expected = [((0, 1, 2), 2), ((2,), 1), ((3, 1), 3)]
+    assert sorted(count_sequences(train_data_file)) == expected
+    assert list(count_sequences(train_data_file, max_sequences_in_memory=1)) == expected
+
+    # clean up
+    os.remove(train_data_file)
+
+
+def test_deduplicate_sequences():
+    units_list, weights = deduplicate_sequences([[3, 1], [0, 1, 2], [3, 1]], [1, 2, 3])
+    assert units_list == [(3, 1), (0, 1, 2)]
+    assert weights == [4, 2]
@@ -1,7 +1,12 @@
 import json
 import logging
+from typing import Optional
 
 from unit_tokenizer import BaseTokenizer
+from unit_tokenizer.cache import LRUCache
+from unit_tokenizer.pair_merger import PairMerger, ShardedPairMerger
+from unit_tokenizer.priority_queue import IndexedPriorityQueue
+from unit_tokenizer.streaming import count_sequences, deduplicate_sequences
 
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
@@ -10,11 +15,14 @@ logging.basicConfig(
 class BPETokenizer(BaseTokenizer):
     """
     Pure BPE tokenizer that operates on a sequence of units.
+    If `cache_size` > 0, encoded sequences are kept in an LRU cache of at most `cache_size` entries
+    (and about `cache_max_bytes` bytes if given), which is cleared on `fit` and `load`.
     """
 
-    def __init__(self) -> None:
+    def __init__(self, cache_size: int = 0, cache_max_bytes: Optional[int] = None) -> None:
         self.logger = logging.getLogger(self.__class__.__name__)
         self.merge_rules: list[tuple[tuple[int, int], int]] = []
+        self.cache: Optional[LRUCache] = LRUCache(cache_size, cache_max_bytes) if cache_size > 0 else None
 
     @property
     def reverse_merge_mapping(self) -> dict[int, tuple[int, int]]:
@@ -49,10 +57,29 @@ class BPETokenizer(BaseTokenizer):
             new_units_list.append(new_units)
         return new_units_list
 
-    def fit(self, train_data: list[list[int]], target_vocab_size: int) -> None:
+    def fit(
+        self,
+        train_data: list[list[int]],
+        target_vocab_size: int,
+        n_jobs: int = 1,
+        weights: Optional[list[int]] = None,
+        deduplicate: bool = False,
+    ) -> None:
         """
         Fit the tokenizer on `train_data`.
+        Pair counts are kept up to date incrementally: after each merge, only the sequences containing the merged pair are rewritten,
+        and only the pairs around the merged positions are recounted.
+        With `n_jobs` > 1, the sequences are sharded across `n_jobs` worker processes that count pairs and apply merges in parallel.
+        If `weights` is given, `train_data[i]` is counted as occurring `weights[i]` times.
+        With `deduplicate`, identical sequences are trained on once, weighted by their total number of occurrences.
         """
+        if weights is not None and (len(weights) != len(train_data) or any(weight <= 0 for weight in weights)):
+            error_message = "Weights must be positive integers, one per sequence."
+            self.logger.error(error_message)
+            raise ValueError(error_message)
+        if deduplicate:
+            train_data, weights = deduplicate_sequences(train_data, weights)
+
         if not train_data or not any(train_data):
             error_message = "Training data is empty."
             self.logger.error(error_message)
@@ -73,33 +100,77 @@ class BPETokenizer(BaseTokenizer):
 
         num_merges = target_vocab_size - initial_vocab_size
         self.logger.info(f"Fitting tokenizer with {num_merges} merges.")
+        if self.cache is not None:
+            self.cache.clear()
         self.logger.debug(f"Initial units: {units_list}")
 
-        for i in range(num_merges):
-            counts = self._get_counts(units_list)
-            if not counts:
-                self.logger.warning("No more pairs to merge.")
-                break
-            top_pair, _count = max(counts.items(), key=lambda x: (x[1], -x[0][0], -x[0][1]))
-            new_idx = max_idx + 1
-            units_list = self._merge(units_list, top_pair, new_idx)
-            self.merge_rules.append((top_pair, new_idx))
-            self.logger.info(f"Merge {i + 1}/{num_merges}: {top_pair} -> {new_idx}")
-            self.logger.debug(f"units: {units_list}")
-            max_idx = new_idx
+        if n_jobs > 1:
+            merger = ShardedPairMerger(units_list, n_jobs, weights)
+        else:
+            merger = PairMerger(units_list, weights)
+        try:
+            queue = IndexedPriorityQueue(merger.counts)
+            for i in range(num_merges):
+                if not queue:
+                    self.logger.warning("No more pairs to merge.")
+                    break
+                top_pair, _count = queue.pop()
+                new_idx = max_idx + 1
+                for pair, delta in merger.merge(top_pair, new_idx).items():
+                    queue.set(pair, queue.get(pair) + delta)
+                self.merge_rules.append((top_pair, new_idx))
+                self.logger.info(f"Merge {i + 1}/{num_merges}: {top_pair} -> {new_idx}")
+                max_idx = new_idx
+        finally:
+            merger.close()
 
-    def fit_from_file(self, train_file: str, target_vocab_size: int) -> None:
+    def fit_from_file(
+        self,
+        train_file: str,
+        target_vocab_size: int,
+        n_jobs: int = 1,
+        streaming: bool = False,
+        max_sequences_in_memory: int = 1_000_000,
+        tmp_dir: Optional[str] = None,
+    ) -> None:
         """
         Fit the tokenizer from a file.
         `train_file` should contain a sequence of integers separated by spaces per line.
+        With `streaming`, the file is never loaded as a whole: identical lines are counted once and trained on as weighted sequences,
+        and the counts are spilled to `tmp_dir` whenever more than `max_sequences_in_memory` distinct lines are held in memory.
         """
+        if streaming:
+            train_data = []
+            weights = []
+            for units, count in count_sequences(train_file, max_sequences_in_memory, tmp_dir):
+                train_data.append(units)
+                weights.append(count)
+            self.fit(train_data, target_vocab_size, n_jobs=n_jobs, weights=weights)
+            return
+
         with open(train_file, "r") as f:
             train_data = [list(map(int, line.strip().split())) for line in f]
-        self.fit(train_data, target_vocab_size)
+        self.fit(train_data, target_vocab_size, n_jobs=n_jobs)
+
+    def _encode(self, units: list[int], ranks: dict[tuple[int, int], tuple[int, int]]) -> list[int]:
+        """
+        Encode a sequence of integers.
+        Instead of trying every merge rule, repeatedly apply the earliest learned rule whose pair is present in the sequence.
+        Merging a pair only creates pairs with the new token, which were learned later, so this is equivalent to applying the rules in order.
+        """
+        units = list(map(int, units))
+        while len(units) > 1:
+            present = [ranks[pair] for pair in zip(units[:-1], units[1:]) if pair in ranks]
+            if not present:
+                break
+            rank, new_token = min(present)
+            units = self._merge([units], self.merge_rules[rank][0], new_token)[0]
+        return units
 
     def encode(self, units_list: list[list[int]]) -> list[list[int]]:
         """
         Encode a batch of sequences of integers by sequentially applying the learned merge rules in order.
+        Each sequence may be any iterable of integers, e.g. a list or an array.
         """
         if not self.merge_rules:
             error_message = "Tokenizer must be fitted or loaded before encoding."
@@ -107,12 +178,13 @@ class BPETokenizer(BaseTokenizer):
             raise ValueError(error_message)
 
         self.logger.debug(f"Encoding: {units_list}")
-        encoded_units_list = []
-        for units in units_list:
-            # Apply each merge rule in the order they were learned.
-            for pair, new_token in self.merge_rules:
-                units = self._merge([units], pair, new_token)[0]
-            encoded_units_list.append(units)
+        ranks = {pair: (rank, new_token) for rank, (pair, new_token) in enumerate(self.merge_rules)}
+        if self.cache is None:
+            encoded_units_list = [self._encode(units, ranks) for units in units_list]
+        else:
+            encoded_units_list = [
+                self.cache.get_or_compute(tuple(units), lambda key: self._encode(key, ranks)) for units in units_list
+            ]
         self.logger.info("Finished encoding.")
         self.logger.debug(f"Encoded: {encoded_units_list}")
         return encoded_units_list
@@ -178,5 +250,7 @@ class BPETokenizer(BaseTokenizer):
             self.logger.error(error_message)
             raise ValueError(error_message)
         self.merge_rules = [((item[0], item[1]), item[2]) for item in merge_rules_data]
+        if self.cache is not None:
+            self.cache.clear()
         self.logger.debug(f"merge_rules: {self.merge_rules}")
         self.logger.info(f"Tokenizer loaded from {json_file}.")
@@ -0,0 +1,62 @@
+from collections import OrderedDict
+from typing import Callable, Optional
+
+
+class LRUCache:
+    """
+    Bounded least-recently-used cache mapping sequences to their encodings.
+    The cache is bounded by `max_entries` and, optionally, by `max_bytes`,
+    where each entry is estimated at 8 bytes per integer of its key and value.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: Optional[int] = None) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.nbytes = 0
+        self._entries: OrderedDict[tuple[int, ...], tuple[int, ...]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def _entry_size(key: tuple[int, ...], value: tuple[int, ...]) -> int:
+        return 8 * (len(key) + len(value))
+
+    def get_or_compute(
+        self, key: tuple[int, ...], compute: Callable[[tuple[int, ...]], list[int]]
+    ) -> list[int]:
+        """
+        Return the cached value of `key`, or compute it with `compute(key)` and cache it.
+        """
+        value = self._entries.get(key)
+        if value is not None:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return list(value)
+        self.misses += 1
+        result = compute(key)
+        self._put(key, tuple(result))
+        return result
+
+    def _put(self, key: tuple[int, ...], value: tuple[int, ...]) -> None:
+        size = self._entry_size(key, value)
+        if self.max_entries <= 0 or (self.max_bytes is not None and size > self.max_bytes):
+            return
+        self._entries[key] = value
+        self.nbytes += size
+        while len(self._entries) > self.max_entries or (
+            self.max_bytes is not None and self.nbytes > self.max_bytes
+        ):
+            old_key, old_value = self._entries.popitem(last=False)
+            self.nbytes -= self._entry_size(old_key, old_value)
+
+    def clear(self) -> None:
+        """
+        Remove all entries and reset the hit and miss counters.
+        """
+        self._entries.clear()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
@@ -1,63 +1,90 @@
+import heapq
 import json
 import logging
-import heapq
+from array import array
 from collections import defaultdict
 from typing import Optional
 from unit_tokenizer import BaseTokenizer
+from unit_tokenizer.cache import LRUCache
+from unit_tokenizer.pair_merger import index_pair_positions
+from unit_tokenizer.priority_queue import IndexedPriorityQueue
+from unit_tokenizer.streaming import count_sequences, deduplicate_sequences
+from unit_tokenizer.trie import NO_TOKEN, ArrayTrie
 
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
 )
 
-class LinkedListNode:
-    __slots__ = ("unit", "prev", "next", "active")
-    def __init__(self, unit: int):
-        self.unit = unit
-        self.prev: Optional[LinkedListNode] = None
-        self.next: Optional[LinkedListNode] = None
-        self.active = True
-
-class TrieNode:
-    def __init__(self):
-        self.children = {}  # Maps a base token (int) to a TrieNode.
-        self.merged_token: Optional[int] = None  # Set to a merged token (int) when this node ends a valid sequence.
-
 class FastBPETokenizer(BaseTokenizer):
     """
     Fast BPE Tokenizer for integer sequences.
-    Uses linked list for efficient sequence updates.
-    Uses a priority queue for fitting and a trie for encoding.
+    Uses array-backed linked lists for efficient sequence updates.
+    Uses a priority queue for fitting, and for encoding either
+    - "merge": applies the merge rules in the order they were learned, using a heap of pair ranks over a linked list.
+      The output is identical to BPETokenizer.encode.
+    - "trie": approximate fast mode using a greedy longest-match search in a trie of the merged tokens.
+      The output may differ from BPETokenizer.encode.
+    If `cache_size` > 0, encoded sequences are kept in an LRU cache of at most `cache_size` entries
+    (and about `cache_max_bytes` bytes if given), which is cleared on `fit` and `load`.
     """
-    def __init__(self) -> None:
+    ENCODE_MODES = ("merge", "trie")
+
+    def __init__(self, encode_mode: str = "merge", cache_size: int = 0, cache_max_bytes: Optional[int] = None) -> None:
         super().__init__()
         self.logger = logging.getLogger(self.__class__.__name__)
+        if encode_mode not in self.ENCODE_MODES:
+            error_message = f"encode_mode must be one of {self.ENCODE_MODES}, got {encode_mode!r}."
+            self.logger.error(error_message)
+            raise ValueError(error_message)
+        self.encode_mode = encode_mode
         self.merge_rules: list[tuple[tuple[int, int], int]] = []
+        self.pair_ranks: dict[tuple[int, int], tuple[int, int]] = {}  # Maps each merged pair to its (rank, merged token).
         self.decoded_merge_rules: dict[int, list[int]] = {}  # Maps each token to its fully decoded sequence.
-        self.trie: TrieNode = TrieNode()  # Root of the trie.
+        self.trie: ArrayTrie = ArrayTrie.build([])  # Trie of the decoded merged tokens.
         self.initial_vocab_max: int = 0  # Maximum initial token value.
+        self.cache: Optional[LRUCache] = LRUCache(cache_size, cache_max_bytes) if cache_size > 0 else None
 
     @staticmethod
-    def _build_linked_list(units: list[int]) -> LinkedListNode:
-        head = LinkedListNode(units[0])
-        current = head
-        for unit in units[1:]:
-            new_node = LinkedListNode(unit)
-            new_node.prev = current
-            current.next = new_node
-            current = new_node
-        return head
+    def _build_linked_arrays(units_list: list[list[int]]) -> tuple[array, array, array]:
+        """
+        Concatenate `units_list` into a flat array of units with parallel `prev` and `next` index arrays.
+        -1 marks the start and the end of each sequence.
+        """
+        units = array("i")
+        for seq in units_list:
+            units.extend(seq)
+        n = len(units)
+        prev = array("i", range(-1, n - 1))
+        next_ = array("i", range(1, n + 1))
+        start = 0
+        for seq in units_list:
+            if seq:
+                prev[start] = -1
+                next_[start + len(seq) - 1] = -1
+                start += len(seq)
+        return units, prev, next_
+
+    def fit(
+        self,
+        units_list: list[list[int]],
+        target_vocab_size: int,
+        n_jobs: int = 1,
+        weights: Optional[list[int]] = None,
+        deduplicate: bool = False,
+    ) -> None:
+        """
+        Fit the tokenizer on `units_list`.
+        With `n_jobs` > 1, the initial pair positions are collected in a pool of `n_jobs` worker processes.
+        If `weights` is given, `units_list[i]` is counted as occurring `weights[i]` times.
+        With `deduplicate`, identical sequences are trained on once, weighted by their total number of occurrences.
+        """
+        if weights is not None and (len(weights) != len(units_list) or any(weight <= 0 for weight in weights)):
+            error_message = "Weights must be positive integers, one per sequence."
+            self.logger.error(error_message)
+            raise ValueError(error_message)
+        if deduplicate:
+            units_list, weights = deduplicate_sequences(units_list, weights)
 
-    @staticmethod
-    def _linked_list_to_list(head: LinkedListNode) -> list[int]:
-        result = []
-        node = head
-        while node:
-            if node.active:
-                result.append(node.unit)
-            node = node.next
-        return result
-
-    def fit(self, units_list: list[list[int]], target_vocab_size: int) -> None:
         if not units_list or not any(units_list):
             error_message = "Training data is empty."
             self.logger.error(error_message)
@@ -81,42 +108,39 @@ class FastBPETokenizer(BaseTokenizer):
         num_merges = target_vocab_size - initial_vocab_size
         self.logger.info(f"Fitting tokenizer with {num_merges} merges.")
 
-        # Build linked lists for each sequence.
-        linked_units_list: list[LinkedListNode] = [self._build_linked_list(units) for units in units_list]
+        # Build one array-backed linked list over the whole corpus.
+        # A position is inactive once its unit has been merged into its left neighbour.
+        units, prev, next_ = self._build_linked_arrays(units_list)
+        active = bytearray(b"\x01") * len(units)
+        position_weights = None
+        if weights is not None:
+            position_weights = array("i")
+            for seq, weight in zip(units_list, weights):
+                position_weights.extend([weight] * len(seq))
 
-        # Map each adjacent pair to the set of left nodes.
-        pairs_positions: dict[tuple[int, int], set[LinkedListNode]] = defaultdict(set)
-        for head in linked_units_list:
-            node = head
-            while node and node.next:
-                if node.active and node.next.active:
-                    pairs_positions[(node.unit, node.next.unit)].add(node)
-                node = node.next
+        # Map each adjacent pair to the positions of its left units.
+        # Positions are only appended; stale ones are skipped when the pair is merged.
+        pairs_positions = index_pair_positions(units, next_, n_jobs)
 
         merge_rules = []
         next_new_unit = self.initial_vocab_max + 1
 
-        # Build a count dictionary and a max-heap (using negative counts).
-        pairs_count = {pair: len(nodes) for pair, nodes in pairs_positions.items()}
-        priority_queue = []
-        for pair, count in pairs_count.items():
-            heapq.heappush(priority_queue, (-count, pair))
+        # Build a priority queue of pair counts, with the same tie-breaking as BPETokenizer.
+        if position_weights is None:
+            pair_counts = {pair: len(positions) for pair, positions in pairs_positions.items()}
+        else:
+            pair_counts = {
+                pair: sum(position_weights[pos] for pos in positions) for pair, positions in pairs_positions.items()
+            }
+        priority_queue = IndexedPriorityQueue(pair_counts)
+        del pair_counts
 
         for i in range(num_merges):
-            most_frequent_pair = None
-            most_frequent_count = 0
-            # Extract the pair with the highest frequency.
-            while priority_queue:
-                neg_count, pair = heapq.heappop(priority_queue)
-                count = -neg_count
-                if pairs_count.get(pair, 0) == count:
-                    most_frequent_pair = pair
-                    most_frequent_count = count
-                    break
-
-            if most_frequent_pair is None or most_frequent_count == 0:
+            if not priority_queue:
                 self.logger.warning("No more valid pairs to merge.")
                 break
+            # Extract the pair with the highest frequency.
+            most_frequent_pair, _count = priority_queue.pop()
 
             a, b = most_frequent_pair
             new_unit = next_new_unit
@@ -125,94 +149,177 @@ class FastBPETokenizer(BaseTokenizer):
             self.decoded_merge_rules[new_unit] = self.decoded_merge_rules[a] + self.decoded_merge_rules[b]
             self.logger.info(f"Merge {i+1}/{num_merges}: {most_frequent_pair} -> {new_unit}")
 
-            update_count_pairs = set()
-            # Process all valid occurrences of the most frequent pair.
-            for node in list(pairs_positions[most_frequent_pair]):
-                if not (node.active and node.next and node.next.active and (node.unit, node.next.unit) == most_frequent_pair):
+            deltas = defaultdict(int)
+            # Process all valid occurrences of the most frequent pair from left to right,
+            # so that overlapping occurrences such as (a, a, a) are merged as in BPETokenizer.
+            for pos in sorted(pairs_positions.pop(most_frequent_pair)):
+                removed = next_[pos]
+                if not (active[pos] and removed != -1 and units[pos] == a and units[removed] == b):
                     continue
-                node.unit = new_unit
-                removed = node.next
-                removed.active = False
-                node.next = removed.next
-                if removed.next:
-                    removed.next.prev = node
+                units[pos] = new_unit
+                active[removed] = 0
+                after = next_[removed]
+                next_[pos] = after
+                if after != -1:
+                    prev[after] = pos
 
                 # Update neighboring pairs.
-                if node.prev:
-                    old_pair = (node.prev.unit, a)
-                    if node.prev in pairs_positions[old_pair]:
-                        pairs_positions[old_pair].discard(node.prev)
-                        update_count_pairs.add(old_pair)
-                    new_pair = (node.prev.unit, node.unit)
-                    pairs_positions[new_pair].add(node.prev)
-                    update_count_pairs.add(new_pair)
-                if node.next:
-                    new_pair = (node.unit, node.next.unit)
-                    pairs_positions[new_pair].add(node)
-                    update_count_pairs.add(new_pair)
-                    old_pair = (b, node.next.unit)
-                    if removed in pairs_positions[old_pair]:
-                        pairs_positions[old_pair].discard(removed)
-                        update_count_pairs.add(old_pair)
+                weight = 1 if position_weights is None else position_weights[pos]
+                before = prev[pos]
+                if before != -1:
+                    deltas[(units[before], a)] -= weight
+                    new_pair = (units[before], new_unit)
+                    deltas[new_pair] += weight
+                    pairs_positions.setdefault(new_pair, array("i")).append(before)
+                if after != -1:
+                    deltas[(b, units[after])] -= weight
+                    new_pair = (new_unit, units[after])
+                    deltas[new_pair] += weight
+                    pairs_positions.setdefault(new_pair, array("i")).append(pos)
 
             # Refresh counts for affected pairs.
-            for pair in update_count_pairs:
-                pairs_count[pair] = len(pairs_positions[pair])
-                heapq.heappush(priority_queue, (-pairs_count[pair], pair))
-            pairs_count[most_frequent_pair] = 0
+            deltas.pop(most_frequent_pair, None)
+            for pair, delta in deltas.items():
+                count = priority_queue.get(pair) + delta
+                priority_queue.set(pair, count)
+                if count <= 0:
+                    pairs_positions.pop(pair, None)
 
         self.merge_rules = merge_rules
         self.logger.info("Finished fitting tokenizer.")
+        self._build_pair_ranks()
         self._build_trie()
+        if self.cache is not None:
+            self.cache.clear()
+
+    def fit_from_file(
+        self,
+        train_file: str,
+        target_vocab_size: int,
+        n_jobs: int = 1,
+        streaming: bool = False,
+        max_sequences_in_memory: int = 1_000_000,
+        tmp_dir: Optional[str] = None,
+    ) -> None:
+        """
+        Fit the tokenizer from a file.
+        `train_file` should contain a sequence of integers separated by spaces per line.
+        With `streaming`, the file is never loaded as a whole: identical lines are counted once and trained on as weighted sequences,
+        and the counts are spilled to `tmp_dir` whenever more than `max_sequences_in_memory` distinct lines are held in memory.
+        """
+        if streaming:
+            units_list = []
+            weights = []
+            for units, count in count_sequences(train_file, max_sequences_in_memory, tmp_dir):
+                units_list.append(units)
+                weights.append(count)
+            self.fit(units_list, target_vocab_size, n_jobs=n_jobs, weights=weights)
+            return
 
-    def fit_from_file(self, train_file: str, target_vocab_size: int) -> None:
         with open(train_file, "r") as f:
             units_list = [list(map(int, line.strip().split())) for line in f]
-        self.fit(units_list, target_vocab_size)
+        self.fit(units_list, target_vocab_size, n_jobs=n_jobs)
+
+    def _build_pair_ranks(self) -> None:
+        """
+        Map each merged pair to its rank in the merge order and its merged token.
+        """
+        self.pair_ranks = {pair: (rank, new_unit) for rank, (pair, new_unit) in enumerate(self.merge_rules)}
 
     def _build_trie(self) -> None:
         """
         Build a trie from cached final sequences for all merged tokens.
         Only tokens greater than initial_vocab_max (i.e. non-base tokens) are added.
         """
-        self.trie = TrieNode()
-        for unit, decoded_units in self.decoded_merge_rules.items():
-            if unit <= self.initial_vocab_max:
+        self.trie = ArrayTrie.build(
+            (decoded_units, unit)
+            for unit, decoded_units in self.decoded_merge_rules.items()
+            if unit > self.initial_vocab_max
+        )
+
+    def _encode_merge(self, units: list[int]) -> list[int]:
+        """
+        Encode a sequence by applying the merge rules in the order they were learned.
+        A heap holds the rank of every mergeable adjacent pair; occurrences of the same pair are merged from left to right.
+        """
+        pair_ranks = self.pair_ranks
+        tokens: list[Optional[int]] = list(units)  # Merged-away positions are set to None.
+        n = len(tokens)
+        next_ = list(range(1, n + 1))
+        prev = list(range(-1, n - 1))
+        if n:
+            next_[-1] = -1
+
+        heap = []
+        for i, pair in enumerate(zip(tokens[:-1], tokens[1:])):
+            rank = pair_ranks.get(pair)
+            if rank is not None:
+                heap.append((rank[0], i))
+        heapq.heapify(heap)
+
+        while heap:
+            rank, i = heapq.heappop(heap)
+            j = next_[i]
+            if tokens[i] is None or j == -1:
+                continue
+            current = pair_ranks.get((tokens[i], tokens[j]))
+            if current is None or current[0] != rank:
                 continue
-            node = self.trie
-            for u in decoded_units:
-                if u not in node.children:
-                    node.children[u] = TrieNode()
-                node = node.children[u]
-            node.merged_token = unit
+            new_unit = current[1]
+            tokens[i] = new_unit
+            tokens[j] = None
+            k = next_[j]
+            next_[i] = k
+            if k != -1:
+                prev[k] = i
+                right = pair_ranks.get((new_unit, tokens[k]))
+                if right is not None:
+                    heapq.heappush(heap, (right[0], i))
+            p = prev[i]
+            if p != -1:
+                left = pair_ranks.get((tokens[p], new_unit))
+                if left is not None:
+                    heapq.heappush(heap, (left[0], p))
+
+        return [token for token in tokens if token is not None]
+
+    def _encode_trie(self, units: list[int]) -> list[int]:
+        """
+        Encode a sequence using a greedy longest-match search in the trie.
+        """
+        trie = self.trie
+        tokens = trie.tokens
+        i = 0
+        encoded_units = []
+        while i < len(units):
+            node = 0
+            match = None
+            j = i
+            # Greedily traverse the trie.
+            while j < len(units):
+                node = trie.child(node, units[j])
+                if node == -1:
+                    break
+                if tokens[node] != NO_TOKEN:
+                    match = (tokens[node], j)
+                j += 1
+            if match is not None:
+                token, j_match = match
+                encoded_units.append(token)
+                i = j_match + 1
+            else:
+                encoded_units.append(units[i])
+                i += 1
+        return encoded_units
 
     def encode(self, units_list: list[list[int]]) -> list[list[int]]:
         """
-        Encode sequences using a greedy longest-match search in the trie.
+        Encode sequences with the method selected by `encode_mode`.
         """
-        encoded_units_list = []
-        for units in units_list:
-            i = 0
-            encoded_units = []
-            while i < len(units):
-                node = self.trie
-                match = None
-                j = i
-                # Greedily traverse the trie.
-                while j < len(units) and units[j] in node.children:
-                    node = node.children[units[j]]
-                    if node.merged_token is not None:
-                        match = (node.merged_token, j)
-                    j += 1
-                if match is not None:
-                    token, j_match = match
-                    encoded_units.append(token)
-                    i = j_match + 1
-                else:
-                    encoded_units.append(units[i])
-                    i += 1
-            encoded_units_list.append(encoded_units)
-        return encoded_units_list
+        encode = self._encode_trie if self.encode_mode == "trie" else self._encode_merge
+        if self.cache is None:
+            return [encode(units) for units in units_list]
+        return [self.cache.get_or_compute(tuple(units), encode) for units in units_list]
 
     def decode(self, units_list: list[list[int]]) -> list[list[int]]:
         """
@@ -263,5 +370,8 @@ class FastBPETokenizer(BaseTokenizer):
             if b not in self.decoded_merge_rules:
                 self.decoded_merge_rules[b] = [b]
             self.decoded_merge_rules[new_unit] = self.decoded_merge_rules[a] + self.decoded_merge_rules[b]
+        self._build_pair_ranks()
         self._build_trie()
+        if self.cache is not None:
+            self.cache.clear()
         self.logger.info(f"Tokenizer loaded from {json_file}.")
@@ -0,0 +1,210 @@
+import multiprocessing
+from array import array
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+
+def build_pair_index(
+    units_list: list[list[int]], weights: Optional[list[int]] = None
+) -> tuple[dict[tuple[int, int], int], dict[tuple[int, int], set[int]]]:
+    """
+    Count the pairs in `units_list` and index the sequences in which each pair occurs.
+    If `weights` is given, each occurrence in `units_list[i]` counts `weights[i]` times.
+    """
+    counts = {}
+    where = defaultdict(set)
+    for seq_idx, units in enumerate(units_list):
+        weight = 1 if weights is None else weights[seq_idx]
+        for pair in zip(units[:-1], units[1:]):
+            counts[pair] = counts.get(pair, 0) + weight
+            where[pair].add(seq_idx)
+    return counts, where
+
+
+def merge_in_place(units: list[int], pair: tuple[int, int], idx: int) -> list[tuple[tuple[int, int], int]]:
+    """
+    Replace all occurrences of `pair` in `units` with `idx` in place.
+    Return the changes in pair counts caused by the merge, found by looking only at the neighbours of each merged position.
+    The changes for `pair` itself are not reported, as no occurrence of it remains after the merge.
+    """
+    a, b = pair
+    changes = []
+    n = len(units)
+    i = 0
+    j = 0
+    while i < n:
+        if i < n - 1 and units[i] == a and units[i + 1] == b:
+            if j > 0:
+                prev = units[j - 1]
+                changes.append(((prev, a), -1))
+                changes.append(((prev, idx), 1))
+            if i + 2 < n:
+                next_ = units[i + 2]
+                changes.append(((b, next_), -1))
+                changes.append(((idx, next_), 1))
+            units[j] = idx
+            i += 2
+        else:
+            units[j] = units[i]
+            i += 1
+        j += 1
+    del units[j:]
+    return changes
+
+
+class PairMerger:
+    """
+    Incremental BPE training state for a list of sequences, each optionally weighted by its number of occurrences.
+    Keeps the pair counts and a pair -> sequence index, and after each merge
+    rewrites only the sequences that contain the merged pair.
+    """
+
+    def __init__(self, units_list: list[list[int]], weights: Optional[list[int]] = None) -> None:
+        self.units_list = [list(units) for units in units_list]
+        self.weights = weights
+        self.counts, self.where = build_pair_index(self.units_list, weights)
+
+    def merge(self, pair: tuple[int, int], idx: int) -> dict[tuple[int, int], int]:
+        """
+        Replace all occurrences of `pair` with `idx` and return the resulting changes in pair counts.
+        """
+        deltas = defaultdict(int)
+        for seq_idx in self.where.pop(pair, ()):
+            weight = 1 if self.weights is None else self.weights[seq_idx]
+            for changed_pair, delta in merge_in_place(self.units_list[seq_idx], pair, idx):
+                deltas[changed_pair] += delta * weight
+                if delta > 0:
+                    self.where[changed_pair].add(seq_idx)
+        deltas.pop(pair, None)
+        self.counts.pop(pair, None)
+        for changed_pair, delta in deltas.items():
+            count = self.counts.get(changed_pair, 0) + delta
+            if count > 0:
+                self.counts[changed_pair] = count
+            else:
+                self.counts.pop(changed_pair, None)
+                self.where.pop(changed_pair, None)
+        return deltas
+
+    def close(self) -> None:
+        pass
+
+
+def _split(items: list, n_shards: int) -> list[list]:
+    """
+    Split `items` into at most `n_shards` contiguous shards of similar size.
+    """
+    n_shards = max(1, min(n_shards, len(items)))
+    size, rest = divmod(len(items), n_shards)
+    shards = []
+    start = 0
+    for k in range(n_shards):
+        end = start + size + (1 if k < rest else 0)
+        shards.append(items[start:end])
+        start = end
+    return shards
+
+
+def _merge_worker(conn, units_list: list[list[int]], weights: Optional[list[int]]) -> None:
+    """
+    Hold one shard in a worker process and apply the merges sent by the parent.
+    """
+    merger = PairMerger(units_list, weights)
+    conn.send(merger.counts)
+    while True:
+        message = conn.recv()
+        if message is None:
+            break
+        pair, idx = message
+        conn.send(dict(merger.merge(pair, idx)))
+    conn.close()
+
+
+class ShardedPairMerger:
+    """
+    `PairMerger` whose sequences are sharded across `n_jobs` worker processes.
+    Each worker applies the merges to its own shard and reports its count deltas, which are summed here.
+    """
+
+    def __init__(self, units_list: list[list[int]], n_jobs: int, weights: Optional[list[int]] = None) -> None:
+        context = multiprocessing.get_context()
+        self.connections = []
+        self.processes = []
+        shards = _split(units_list, n_jobs)
+        weight_shards = [None] * len(shards) if weights is None else _split(weights, len(shards))
+        for shard, weight_shard in zip(shards, weight_shards):
+            parent_conn, child_conn = context.Pipe()
+            process = context.Process(target=_merge_worker, args=(child_conn, shard, weight_shard), daemon=True)
+            process.start()
+            child_conn.close()
+            self.connections.append(parent_conn)
+            self.processes.append(process)
+        self.counts = self._reduce(conn.recv() for conn in self.connections)
+
+    @staticmethod
+    def _reduce(results) -> dict[tuple[int, int], int]:
+        total = {}
+        for result in results:
+            for pair, count in result.items():
+                total[pair] = total.get(pair, 0) + count
+        return total
+
+    def merge(self, pair: tuple[int, int], idx: int) -> dict[tuple[int, int], int]:
+        """
+        Replace all occurrences of `pair` with `idx` in every shard and return the summed changes in pair counts.
+        """
+        for conn in self.connections:
+            conn.send((pair, idx))
+        return self._reduce(conn.recv() for conn in self.connections)
+
+    def close(self) -> None:
+        for conn in self.connections:
+            conn.send(None)
+            conn.close()
+        for process in self.processes:
+            process.join()
+        self.connections = []
+        self.processes = []
+
+
+def _index_pair_positions(units: array, next_: array, offset: int) -> dict[tuple[int, int], array]:
+    """
+    Map each adjacent pair to the positions of its left units, for a slice of a linked array starting at `offset`.
+    """
+    pairs_positions = {}
+    for i, j in enumerate(next_, offset):
+        if j != -1:
+            pair = (units[i - offset], units[j - offset])
+            positions = pairs_positions.get(pair)
+            if positions is None:
+                positions = pairs_positions[pair] = array("i")
+            positions.append(i)
+    return pairs_positions
+
+
+def index_pair_positions(units: array, next_: array, n_jobs: int = 1) -> dict[tuple[int, int], array]:
+    """
+    Map each adjacent pair of an array-backed linked list to the positions of its left units.
+    With `n_jobs` > 1 the arrays are split into chunks that are indexed in a process pool.
+    Positions of each pair are returned in increasing order.
+    """
+    n = len(units)
+    if n_jobs <= 1 or n < 2 * n_jobs:
+        return _index_pair_positions(units, next_, 0)
+
+    # Each chunk also carries the unit right after it, so that pairs crossing chunk boundaries are counted.
+    bounds = [n * k // n_jobs for k in range(n_jobs + 1)]
+    tasks = [
+        (units[start : min(end + 1, n)], next_[start:end], start)
+        for start, end in zip(bounds[:-1], bounds[1:])
+    ]
+    pairs_positions = {}
+    with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+        for result in executor.map(_index_pair_positions, *zip(*tasks)):
+            for pair, positions in result.items():
+                if pair in pairs_positions:
+                    pairs_positions[pair].extend(positions)
+                else:
+                    pairs_positions[pair] = positions
+    return pairs_positions
@@ -0,0 +1,127 @@
+from typing import Optional
+
+
+def merge_priority(pair: tuple[int, int], count: int) -> tuple[int, int, int]:
+    """
+    Priority of a pair when choosing the next merge.
+    The most frequent pair wins; ties are broken in favour of the smallest first unit, then the smallest second unit.
+    """
+    return (count, -pair[0], -pair[1])
+
+
+class IndexedPriorityQueue:
+    """
+    Max-priority queue of pairs ordered by `merge_priority`.
+    Each pair is stored at most once, and its count can be increased or decreased in place,
+    so the heap never holds more entries than there are live pairs.
+    """
+
+    __slots__ = ("_heap", "_counts", "_positions")
+
+    def __init__(self, counts: Optional[dict[tuple[int, int], int]] = None) -> None:
+        self._counts: dict[tuple[int, int], int] = {}
+        self._heap: list[tuple[int, int]] = []
+        self._positions: dict[tuple[int, int], int] = {}
+        if counts:
+            for pair, count in counts.items():
+                if count > 0:
+                    self._counts[pair] = count
+                    self._positions[pair] = len(self._heap)
+                    self._heap.append(pair)
+            for i in reversed(range(len(self._heap) // 2)):
+                self._sift_down(i)
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def __contains__(self, pair: tuple[int, int]) -> bool:
+        return pair in self._positions
+
+    def get(self, pair: tuple[int, int], default: int = 0) -> int:
+        """
+        Return the count of `pair`, or `default` if it is not in the queue.
+        """
+        return self._counts.get(pair, default)
+
+    def set(self, pair: tuple[int, int], count: int) -> None:
+        """
+        Insert `pair` or change its count. A count of zero or less removes it.
+        """
+        if count <= 0:
+            self.remove(pair)
+            return
+        position = self._positions.get(pair)
+        if position is None:
+            self._counts[pair] = count
+            self._positions[pair] = len(self._heap)
+            self._heap.append(pair)
+            self._sift_up(len(self._heap) - 1)
+            return
+        old_count = self._counts[pair]
+        self._counts[pair] = count
+        if count > old_count:
+            self._sift_up(position)
+        elif count < old_count:
+            self._sift_down(position)
+
+    def remove(self, pair: tuple[int, int]) -> None:
+        """
+        Remove `pair` from the queue if present.
+        """
+        position = self._positions.pop(pair, None)
+        if position is None:
+            return
+        del self._counts[pair]
+        last = self._heap.pop()
+        if position < len(self._heap):
+            self._heap[position] = last
+            self._positions[last] = position
+            self._sift_up(position)
+            self._sift_down(self._positions[last])
+
+    def peek(self) -> tuple[tuple[int, int], int]:
+        """
+        Return the pair with the highest priority and its count without removing it.
+        """
+        if not self._heap:
+            raise IndexError("peek from an empty priority queue")
+        pair = self._heap[0]
+        return pair, self._counts[pair]
+
+    def pop(self) -> tuple[tuple[int, int], int]:
+        """
+        Remove and return the pair with the highest priority and its count.
+        """
+        pair, count = self.peek()
+        self.remove(pair)
+        return pair, count
+
+    def _key(self, position: int) -> tuple[int, int, int]:
+        pair = self._heap[position]
+        return merge_priority(pair, self._counts[pair])
+
+    def _swap(self, i: int, j: int) -> None:
+        heap = self._heap
+        heap[i], heap[j] = heap[j], heap[i]
+        self._positions[heap[i]] = i
+        self._positions[heap[j]] = j
+
+    def _sift_up(self, position: int) -> None:
+        while position > 0:
+            parent = (position - 1) // 2
+            if self._key(position) <= self._key(parent):
+                break
+            self._swap(position, parent)
+            position = parent
+
+    def _sift_down(self, position: int) -> None:
+        n = len(self._heap)
+        while True:
+            largest = position
+            for child in (2 * position + 1, 2 * position + 2):
+                if child < n and self._key(child) > self._key(largest):
+                    largest = child
+            if largest == position:
+                break
+            self._swap(position, largest)
+            position = largest
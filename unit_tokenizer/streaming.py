@@ -0,0 +1,74 @@
+import heapq
+import os
+import tempfile
+from itertools import groupby
+from typing import Iterator, Optional
+
+
+def deduplicate_sequences(
+    units_list: list[list[int]], weights: Optional[list[int]] = None
+) -> tuple[list[tuple[int, ...]], list[int]]:
+    """
+    Merge identical sequences of `units_list`, in order of first occurrence, and sum their weights.
+    Each sequence has a weight of 1 if `weights` is None.
+    """
+    counts: dict[tuple[int, ...], int] = {}
+    for i, units in enumerate(units_list):
+        units = tuple(units)
+        counts[units] = counts.get(units, 0) + (1 if weights is None else weights[i])
+    return list(counts), list(counts.values())
+
+
+def _write_chunk(counts: dict[tuple[int, ...], int], tmp_dir: Optional[str]) -> str:
+    """
+    Write `counts` to a temporary file, sorted by sequence, one "count unit unit ..." line per sequence.
+    """
+    fd, path = tempfile.mkstemp(prefix="unit_tokenizer_", suffix=".txt", dir=tmp_dir)
+    with os.fdopen(fd, "w") as f:
+        for units in sorted(counts):
+            f.write(f"{counts[units]} {' '.join(map(str, units))}\n")
+    return path
+
+
+def _read_chunk(path: str) -> Iterator[tuple[tuple[int, ...], int]]:
+    with open(path, "r") as f:
+        for line in f:
+            count, *units = map(int, line.split())
+            yield tuple(units), count
+
+
+def count_sequences(
+    train_file: str, max_sequences_in_memory: int = 1_000_000, tmp_dir: Optional[str] = None
+) -> Iterator[tuple[tuple[int, ...], int]]:
+    """
+    Stream `train_file` and yield each distinct non-empty sequence with the number of times it occurs.
+    `train_file` should contain a sequence of integers separated by spaces per line.
+    At most `max_sequences_in_memory` distinct sequences are counted in memory at a time;
+    beyond that, the counts are spilled to sorted chunks in `tmp_dir` and merged back while iterating.
+    """
+    counts: dict[tuple[int, ...], int] = {}
+    chunk_paths = []
+    try:
+        with open(train_file, "r") as f:
+            for line in f:
+                units = tuple(map(int, line.split()))
+                if not units:
+                    continue
+                counts[units] = counts.get(units, 0) + 1
+                if len(counts) >= max_sequences_in_memory:
+                    chunk_paths.append(_write_chunk(counts, tmp_dir))
+                    counts = {}
+
+        if not chunk_paths:
+            yield from counts.items()
+            return
+
+        if counts:
+            chunk_paths.append(_write_chunk(counts, tmp_dir))
+            counts = {}
+        merged = heapq.merge(*(_read_chunk(path) for path in chunk_paths), key=lambda item: item[0])
+        for units, items in groupby(merged, key=lambda item: item[0]):
+            yield units, sum(count for _units, count in items)
+    finally:
+        for path in chunk_paths:
+            os.remove(path)
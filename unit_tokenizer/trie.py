@@ -0,0 +1,107 @@
+import struct
+from array import array
+from typing import Iterable, Sequence
+
+NO_TOKEN = -1
+
+
+class ArrayTrie:
+    """
+    Double-array trie over integer sequences, stored as flat int32 arrays.
+    Node 0 is the root. The child of node `v` labelled `u` is node `t = base[v] + u` if `check[t] == v`.
+    `tokens[v]` is the token that ends at node `v`, or NO_TOKEN.
+    The arrays may be any buffer of int32 values, e.g. memoryviews into a mapped file.
+    """
+
+    __slots__ = ("base", "check", "tokens")
+
+    def __init__(self, base: Sequence[int], check: Sequence[int], tokens: Sequence[int]):
+        self.base = base
+        self.check = check
+        self.tokens = tokens
+
+    @classmethod
+    def build(cls, sequences: Iterable[tuple[Sequence[int], int]]) -> "ArrayTrie":
+        """
+        Build a trie from `(sequence, token)` items.
+        """
+        # Build a pointer-free intermediate trie, then place the children of each node
+        # at the first base offset where all of their slots are free.
+        children: list[dict[int, int]] = [{}]
+        node_tokens = [NO_TOKEN]
+        for units, token in sequences:
+            node = 0
+            for unit in units:
+                child = children[node].get(unit)
+                if child is None:
+                    child = children[node][unit] = len(children)
+                    children.append({})
+                    node_tokens.append(NO_TOKEN)
+                node = child
+            node_tokens[node] = token
+
+        base = array("i", [0])
+        check = array("i", [-1])
+        tokens = array("i", [node_tokens[0]])
+        used = bytearray(b"\x01")  # The root slot is always taken.
+        queue = [(0, 0)]  # (intermediate node, slot)
+        for node, slot in queue:
+            labels = sorted(children[node])
+            if not labels:
+                continue
+            # Try each free slot for the first label until all the other labels fit too.
+            free = used.find(0, 1)
+            while True:
+                if free == -1:
+                    free = len(used)
+                offset = free - labels[0]
+                if offset >= 1 and all(offset + label >= len(used) or not used[offset + label] for label in labels):
+                    break
+                free = used.find(0, free + 1)
+            end = offset + labels[-1] + 1
+            if end > len(used):
+                grow = end - len(used)
+                base.extend([0] * grow)
+                check.extend([-1] * grow)
+                tokens.extend([NO_TOKEN] * grow)
+                used.extend(bytes(grow))
+            base[slot] = offset
+            for label in labels:
+                child = children[node][label]
+                check[offset + label] = slot
+                tokens[offset + label] = node_tokens[child]
+                used[offset + label] = 1
+                queue.append((child, offset + label))
+        return cls(base, check, tokens)
+
+    def __len__(self) -> int:
+        return len(self.check)
+
+    def child(self, node: int, unit: int) -> int:
+        """
+        Return the child of `node` labelled `unit`, or -1 if there is none.
+        """
+        slot = self.base[node] + unit
+        if 0 <= slot < len(self.check) and self.check[slot] == node:
+            return slot
+        return -1
+
+    def to_bytes(self) -> bytes:
+        """
+        Serialise the trie as a header with the number of slots, followed by the raw arrays.
+        """
+        header = struct.pack("=q", len(self.check))
+        return b"".join([header] + [array("i", values).tobytes() for values in (self.base, self.check, self.tokens)])
+
+    @classmethod
+    def from_bytes(cls, data) -> "ArrayTrie":
+        """
+        Open a trie serialised with `to_bytes`. The arrays are views into `data`, which is not copied.
+        """
+        (n_slots,) = struct.unpack_from("=q", data)
+        view = memoryview(data)[8:]
+        arrays = []
+        for _ in range(3):
+            arrays.append(view[: 4 * n_slots].cast("i"))
+            view = view[4 * n_slots :]
+        return cls(*arrays)